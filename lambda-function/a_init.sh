@@ -109,19 +109,33 @@ fi
 
 #############################################################################
 # STEP 4: Create DynamoDB table for chat data
-# This table will store all chat sessions with chat_id as the primary key
+# This table will store all chat sessions, one item per message
 #############################################################################
 if [[ "$DO_CREATE_TABLE" == "true" ]]; then
   echo "Creating DynamoDB table '$TABLE_NAME' to store chat sessions"
   aws dynamodb create-table \
     --table-name $TABLE_NAME \
-    --attribute-definitions AttributeName=chat_id,AttributeType=S \
-    --key-schema AttributeName=chat_id,KeyType=HASH \
+    --attribute-definitions AttributeName=chat_id,AttributeType=S AttributeName=seq,AttributeType=N AttributeName=user_id,AttributeType=S \
+    --key-schema AttributeName=chat_id,KeyType=HASH AttributeName=seq,KeyType=RANGE \
+    --global-secondary-indexes '[
+        {
+            "IndexName": "user_id-index",
+            "KeySchema": [{"AttributeName": "user_id", "KeyType": "HASH"}],
+            "Projection": {"ProjectionType": "KEYS_ONLY"}
+        }
+    ]' \
     --billing-mode PAY_PER_REQUEST \
     --region $AWS_REGION
   echo "DynamoDB table creation step completed."
   # Notes on the DynamoDB settings:
-  # - chat_id is the primary key (HASH key in DynamoDB terminology)
+  # - chat_id is the partition key (HASH key in DynamoDB terminology) and seq
+  #   the sort key (RANGE key): seq 0 holds the chat metadata, seq -1 the
+  #   system prompt and seq 1, 2, ... the messages in order
+  # - user_id-index is a global secondary index used to count a user's chats
+  #   without scanning the whole table; only the metadata items carry user_id
+  # - Tables created by earlier versions (chat_id key only, messages stored as a
+  #   list) cannot be migrated in place. Export them with
+  #   scripts/export_dynamodb_table.py and create a new table
   # - PAY_PER_REQUEST means you only pay for actual usage (no capacity planning needed)
   # - The table will automatically scale based on traffic
   # - If you get a 'ResourceInUseException', the table already exists and you can ignore this error
@@ -1,10 +1,13 @@
-import json
+import functools
 import logging
 import os
+import orjson
 from main import (
     initialize_chat, 
+    initialize_chats,
     add_message_and_get_response, 
-    get_chat_history
+    get_chat_history,
+    prewarm_clients
 )
 from user_config import ALLOWED_USER_IDS
 
@@ -12,30 +15,61 @@ from user_config import ALLOWED_USER_IDS
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Provisioned concurrency initializes environments before traffic arrives,
+# so SDK imports and client construction can happen here instead of in the
+# first request
+if os.environ.get('AWS_LAMBDA_INITIALIZATION_TYPE') == 'provisioned-concurrency':
+    prewarm_clients()
+
 _allowed = {'http://localhost:8000'}
 prod = os.getenv('ALLOWED_PROD_ORIGIN', '').rstrip('/')
 
 wildcard = (prod == '*')
 if prod and prod != '*':
     _allowed.add(prod)
+_allowed_prefixes = tuple(_allowed)
 
 def _is_allowed_origin(origin):
     # Check if the origin starts with any of our allowed domains
-    return any(origin.startswith(allowed) for allowed in _allowed)
+    return origin.startswith(_allowed_prefixes)
+
+# Response parts that never change are built once at import
+_CORS_TEMPLATE = {
+    'Access-Control-Allow-Headers': '*',
+    'Access-Control-Allow-Methods': 'POST,OPTIONS',
+}
+_ORIGIN_NOT_ALLOWED_BODY = orjson.dumps({'error': 'Origin not allowed'}).decode()
+_USER_NOT_ALLOWED_BODY = orjson.dumps({'error': 'User not allowed'}).decode()
+_MISSING_CHATS_BODY = orjson.dumps({'error': 'Missing: chats'}).decode()
+_PREFLIGHT_BODY = orjson.dumps({'message': 'CORS preflight successful'}).decode()
 
+@functools.lru_cache(maxsize=8)
 def _cors_headers(origin):
+    # Cached per origin; callers must not mutate the returned dict
     return {
         'Access-Control-Allow-Origin': '*' if wildcard else origin,
-        'Access-Control-Allow-Headers': '*',
-        'Access-Control-Allow-Methods': 'POST,OPTIONS',
+        **_CORS_TEMPLATE,
+    }
+
+@functools.lru_cache(maxsize=8)
+def _preflight_response(origin):
+    # Cached per origin; callers must not mutate the returned dict
+    return {
+        'statusCode': 200,
+        'headers': _cors_headers(origin),
+        'body': _PREFLIGHT_BODY
     }
 
 def handler(event, context):
     """
     Lambda handler function to process API Gateway events.
     
+    Only POST requests are routed to the function; CORS preflights are
+    answered by API Gateway (see CorsConfiguration in template.yaml).
+    
     Routes:
     - initialize: Create a new chat session
+    - initialize_batch: Create several chat sessions (payload['chats'])
     - chat: Add a message and get a response
     - history: Get chat history
     
@@ -47,48 +81,60 @@ def handler(event, context):
         dict: API Gateway response
     """
     
-    headers = event.get('headers', {})
+    headers = event.get('headers') or {}
     origin = (headers.get('Origin') or headers.get('origin') or '').rstrip('/')
+
+    # Should a preflight still reach the function (e.g. with sam local),
+    # answer it before any other work; browsers enforce the returned
+    # Access-Control-Allow-Origin header themselves
+    if event.get('httpMethod') == 'OPTIONS':
+        return _preflight_response(origin)
  
     if not _is_allowed_origin(origin):
         # no CORS headers on 403 forces browser to block
         logger.warning(f"Origin '{origin}' not allowed")
-        return {'statusCode': 403, 'body': json.dumps({'error': 'Origin not allowed'})}
-
-    if event.get('httpMethod') == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': _cors_headers(origin),
-            'body': json.dumps({'message': 'CORS preflight successful'})
-        }
+        return {'statusCode': 403, 'body': _ORIGIN_NOT_ALLOWED_BODY}
 
     try:
         # Parse request body
-        body = json.loads(event.get('body', '{}'))
+        body = orjson.loads(event.get('body') or '{}')
         route = body.get('route')
         payload = body.get('payload', {})
 
-        # Add debug logging
-        logger.info(f"Received request with route: {route}")
-        logger.info(f"Payload: {payload}")
+        # Debug logging; lazy formatting keeps it free at the INFO level
+        logger.debug("Received request with route: %s", route)
+        logger.debug("Payload: %s", payload)
         
-        # Validate common required parameters
-        missing = [k for k in ('user_id','chat_id') if k not in payload]
-        if missing:
-            return {
-                'statusCode': 400,
-                'headers': _cors_headers(origin),
-                'body': json.dumps({'error': f"Missing: {', '.join(missing)}"})
-            }
+        # The batch route carries one payload per chat
+        if route == 'initialize_batch':
+            chat_payloads = payload.get('chats')
+            if not isinstance(chat_payloads, list) or not chat_payloads:
+                return {
+                    'statusCode': 400,
+                    'headers': _cors_headers(origin),
+                    'body': _MISSING_CHATS_BODY
+                }
+        else:
+            chat_payloads = [payload]
         
-        # Allow all user_ids if origin is localhost, else allow specific user_ids
-        # optional user check
-        user_id = payload['user_id']
-        if origin != 'http://localhost:8000' and ALLOWED_USER_IDS and user_id not in ALLOWED_USER_IDS:
-            return {
-                'statusCode': 403, 
-                'body': json.dumps({'error': 'User not allowed'})
-            }
+        for chat_payload in chat_payloads:
+            # Validate common required parameters
+            missing = [k for k in ('user_id','chat_id') if k not in chat_payload]
+            if missing:
+                return {
+                    'statusCode': 400,
+                    'headers': _cors_headers(origin),
+                    'body': orjson.dumps({'error': f"Missing: {', '.join(missing)}"}).decode()
+                }
+            
+            # Allow all user_ids if origin is localhost, else allow specific user_ids
+            # optional user check
+            user_id = chat_payload['user_id']
+            if origin != 'http://localhost:8000' and ALLOWED_USER_IDS and user_id not in ALLOWED_USER_IDS:
+                return {
+                    'statusCode': 403, 
+                    'body': _USER_NOT_ALLOWED_BODY
+                }
 
         # Route the request
         if route == 'initialize':
@@ -103,6 +149,9 @@ def handler(event, context):
                 use_server_treatment=payload.get('use_server_treatment', False)
             )
 
+        elif route == 'initialize_batch':
+            result = initialize_chats(chat_payloads)
+
         elif route == 'chat':
             if 'message' not in payload:
                 raise ValueError('message is required')
@@ -124,7 +173,7 @@ def handler(event, context):
         return {
             'statusCode': 200 if 'error' not in result else 400,
             'headers': _cors_headers(origin),
-            'body': json.dumps(result)
+            'body': orjson.dumps(result).decode()
         }
         
     except Exception as e:
@@ -132,5 +181,5 @@ def handler(event, context):
         return {
             'statusCode': 500,
             'headers': _cors_headers(origin),
-            'body': json.dumps({'error': str(e)})
+            'body': orjson.dumps({'error': str(e)}).decode()
         }
\ No newline at end of file
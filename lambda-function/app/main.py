@@ -2,19 +2,84 @@ import time
 import os
 import logging
 import random
+import threading
 import boto3
+import zstandard
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Union, Tuple
-from openai import OpenAI
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize clients
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE', 'vibe_chats'))
-openai_client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+# Initialize clients at module scope so warm invocations reuse their
+# connection pools; TCP keep-alive stops idle sockets from being dropped
+# between invocations, which would force a new TLS handshake
+dynamodb_config = Config(
+    tcp_keepalive=True,
+    retries={'mode': 'standard', 'max_attempts': 3},
+    connect_timeout=1,
+    read_timeout=3
+)
+# The low-level client is much cheaper to construct on cold start than a
+# boto3 resource; items are converted with the (de)serializers below
+dynamodb = boto3.client('dynamodb', config=dynamodb_config)
+TABLE_NAME = os.environ.get('DYNAMODB_TABLE', 'vibe_chats')
+# Global secondary index on user_id, created alongside the table in a_init.sh
+USER_ID_INDEX = 'user_id-index'
+# Threads for running independent DynamoDB requests concurrently (the boto3
+# client is thread-safe); kept at module scope to be reused when warm
+dynamodb_executor = ThreadPoolExecutor(max_workers=8)
+
+# The OpenAI client is created on first use, so routes that never call the
+# API (e.g. history) do not pay for importing the SDK on cold start. Once
+# created it is kept for the lifetime of the container, together with its
+# HTTP/2 connection pool, so warm invocations skip the TLS handshake
+_openai_client = None
+
+
+def _get_openai_client():
+    """Return the shared OpenAI client, creating it on first use."""
+    global _openai_client
+    if _openai_client is None:
+        import httpx
+        from openai import OpenAI
+        http_client = httpx.Client(
+            http2=True,
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=2.0),
+            limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60)
+        )
+        _openai_client = OpenAI(
+            api_key=os.environ.get('OPENAI_API_KEY'),
+            http_client=http_client,
+            max_retries=OPENAI_MAX_RETRIES
+        )
+    return _openai_client
+
+def prewarm_clients() -> None:
+    """
+    Set up the DynamoDB and OpenAI clients ahead of the first request.
+    
+    What reliably carries over to the first request is the work done once per
+    environment: importing the OpenAI SDK, building both clients and
+    resolving credentials and endpoints. The connections opened here are
+    only reused if a request arrives before they idle out (keepalive_expiry
+    for the OpenAI pool); provisioned environments often wait longer than
+    that, and the first request then opens a new connection. Failures are
+    only logged.
+    """
+    try:
+        dynamodb.describe_table(TableName=TABLE_NAME)
+    except Exception as e:
+        logger.warning(f"Could not pre-warm DynamoDB connection: {str(e)}")
+    try:
+        _get_openai_client().with_options(timeout=1.5, max_retries=0).models.list()
+    except Exception as e:
+        logger.warning(f"Could not pre-warm OpenAI connection: {str(e)}")
 
 # Type definitions for clarity
 ChatMessage = Dict[str, str]
@@ -23,12 +88,163 @@ ResponseDict = Dict[str, Any]
 ErrorDict = Dict[str, str]
 OpenAIMessage = Dict[str, str]
 
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def _to_dynamodb(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert plain Python values to DynamoDB attribute values."""
+    return {k: _serializer.serialize(v) for k, v in values.items()}
+
+
+def _from_dynamodb(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert DynamoDB attribute values to plain Python values."""
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+
+# Table layout: every chat is stored as one item per message under the
+# chat_id partition key, ordered by the numeric sort key seq. The item with
+# seq 0 holds the chat metadata (user_id, treatment, timestamps, the number
+# of stored messages and of user messages); messages start at seq 1.
+# Appending a message therefore only writes the new items instead of
+# rewriting the whole chat. The system prompt is kept apart from the
+# messages in its own item at seq -1, so it sorts first but never has to be
+# filtered out of what participants see.
+SYSTEM_SEQ = -1
+META_SEQ = 0
+
+# Message contents larger than this many bytes (i.e. more than one write
+# capacity unit) are stored zstd-compressed in a binary content_z attribute,
+# marked with encoding='zstd'; shorter contents are stored as plain text
+COMPRESS_MIN_BYTES = 1024
+
+# zstandard (de)compressors are not thread-safe, so each thread gets its own
+_zstd = threading.local()
+
+
+def _compress_content(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace a long content string with its zstd-compressed bytes."""
+    data = message['content'].encode('utf-8')
+    if len(data) <= COMPRESS_MIN_BYTES:
+        return message
+    if not hasattr(_zstd, 'compressor'):
+        _zstd.compressor = zstandard.ZstdCompressor(level=3)
+    compressed = {k: v for k, v in message.items() if k != 'content'}
+    compressed['content_z'] = _zstd.compressor.compress(data)
+    compressed['encoding'] = 'zstd'
+    return compressed
+
+
+def _decompress_content(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Restore the content string of an item written by _compress_content."""
+    if item.pop('encoding', None) == 'zstd':
+        if not hasattr(_zstd, 'decompressor'):
+            _zstd.decompressor = zstandard.ZstdDecompressor()
+        data = item.pop('content_z').value
+        item['content'] = _zstd.decompressor.decompress(data).decode('utf-8')
+    return item
+
+
+def _message_item(chat_id: str, seq: int, message: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the DynamoDB item for a single chat message."""
+    return {'chat_id': chat_id, 'seq': seq, **_compress_content(message)}
+
+
+# Attributes needed to prompt OpenAI for a chat turn. Message timestamps and
+# the remaining metadata are not read, so the loaded messages are already in
+# the {'role', 'content'} shape the API expects and need no copying
+PROMPT_ATTRIBUTES = (
+    'chat_id', 'seq', 'role', 'content', 'content_z', 'encoding',
+    'user_id', 'message_count', 'user_message_count'
+)
+
+
+def _load_chat(
+    chat_id: str,
+    consistent: bool = False,
+    attributes: Optional[Tuple[str, ...]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch a chat with all its messages in a single query.
+    
+    Args:
+        chat_id: Unique identifier for the chat session
+        consistent: Whether to use a strongly consistent read
+        attributes: Only read these attributes (must include chat_id and seq)
+    
+    Returns the metadata item with the system prompt message (or None) under
+    'system' and the other messages (in order) under 'messages', or None if
+    the chat does not exist.
+    """
+    params = {}
+    if attributes:
+        names = {f'#a{i}': name for i, name in enumerate(attributes)}
+        params['ProjectionExpression'] = ', '.join(names)
+        params['ExpressionAttributeNames'] = names
+    
+    chat = None
+    system = None
+    messages = []
+    paginator = dynamodb.get_paginator('query')
+    for page in paginator.paginate(
+        TableName=TABLE_NAME,
+        KeyConditionExpression='chat_id = :cid',
+        ExpressionAttributeValues=_to_dynamodb({':cid': chat_id}),
+        ConsistentRead=consistent,
+        **params
+    ):
+        for raw_item in page['Items']:
+            item = _from_dynamodb(raw_item)
+            seq = item.pop('seq')
+            if seq == META_SEQ:
+                chat = item
+            else:
+                del item['chat_id']
+                item = _decompress_content(item)
+                if seq == SYSTEM_SEQ:
+                    system = item
+                else:
+                    messages.append(item)
+    
+    if chat is None:
+        return None
+    chat['message_count'] = int(chat.get('message_count', 0))
+    chat['user_message_count'] = int(chat.get('user_message_count', 0))
+    chat['system'] = system
+    chat['messages'] = messages
+    return chat
+
+
 # High limit for number of messages per chat; just to prevent misuse
 # A malignant user can only sent 100 messages max per chat, and start 20 chats
 # Set these limits as low as fits your experiment; set to None if you want no
 # restrictions
 MAX_MESSAGES_PER_CHAT = 100
 MAX_CHATS_PER_USER = 20
+# Maximum number of chats a single initialize_batch request may create
+MAX_CHATS_PER_BATCH = 50
+# Maximum number of OpenAI calls (one per distinct prompt) and of generated
+# replies in total that a single initialize_batch request may trigger, so
+# one request cannot bypass the API Gateway throttle
+MAX_OPENAI_CALLS_PER_BATCH = 10
+MAX_REPLIES_PER_BATCH = 20
+
+# Threads for the concurrent OpenAI calls of initialize_batch, separate from
+# dynamodb_executor so slow completions never hold up DynamoDB requests
+openai_executor = ThreadPoolExecutor(max_workers=MAX_OPENAI_CALLS_PER_BATCH or 10)
+
+# Number of most recent user/assistant turns sent to OpenAI along with the
+# system prompt; older messages stay stored but are no longer part of the
+# prompt. Set to None to always send the full history
+HISTORY_WINDOW_TURNS = 8
+
+# Completions are streamed from OpenAI, so this timeout bounds the wait for
+# each chunk rather than the whole answer. Timed-out requests are not retried
+# (each retry would wait the full timeout again), so with the 2s connect
+# timeout a stalled generation fails after about 22s, within the 30s API
+# Gateway limit, instead of timing out the request
+OPENAI_TIMEOUT = 20
+OPENAI_MAX_RETRIES = 0
 
 STYLE_INSTRUCTIONS = (
     "Antworte in der Sprache, die dein Gesprächspartner benutzt. "
@@ -153,6 +369,33 @@ def get_treatment_prompt(opinion: Optional[str] = None) -> str:
     return base
 
 
+def _window_messages(
+    system: Optional[ChatMessage],
+    messages: ChatHistory
+) -> ChatHistory:
+    """
+    Select the messages that are sent to the OpenAI API.
+    
+    Puts the system prompt (if any) first and, if HISTORY_WINDOW_TURNS is set,
+    keeps only the most recent turns, so prompt size stays bounded for long
+    chats. The message dicts themselves are not copied.
+    """
+    if HISTORY_WINDOW_TURNS:
+        messages = messages[-2 * HISTORY_WINDOW_TURNS:]
+    return [system, *messages] if system else list(messages)
+
+
+def _build_openai_messages(
+    system: Optional[ChatMessage],
+    messages: ChatHistory
+) -> List[OpenAIMessage]:
+    """Format stored messages (with timestamps) for the OpenAI API."""
+    return [
+        {'role': msg['role'], 'content': msg['content']}
+        for msg in _window_messages(system, messages)
+    ]
+
+
 def call_openai_api(
     messages: List[OpenAIMessage], 
     model: str = "gpt-5.4",
@@ -171,27 +414,67 @@ def call_openai_api(
             - The assistant's response message (or None if error)
             - Error message (or None if successful)
     """
+    choices, error = call_openai_api_n(messages, 1, model, max_tokens)
+    if error:
+        return None, error
+    return choices[0], None
+
+
+def call_openai_api_n(
+    messages: List[OpenAIMessage],
+    n: int,
+    model: str = "gpt-5.4",
+    max_tokens: Optional[int] = 1000
+) -> Tuple[Optional[List[str]], Optional[str]]:
+    """
+    Make a call to the OpenAI API that generates n independent responses.
+    
+    Args:
+        messages: List of messages to send to the API
+        n: Number of responses to generate for the same messages
+        model: OpenAI model to use
+        max_tokens: Maximum number of tokens to generate per response
+    
+    Returns:
+        Tuple containing:
+            - List of n assistant response messages (or None if error)
+            - Error message (or None if successful)
+    """
     try:
         start_time = time.time()
         
         # Prepare API call parameters
         params = {
             "model": model,
-            "messages": messages
+            "messages": messages,
+            "stream": True
         }
+        if n > 1:
+            params["n"] = n
         
         # Add max_tokens if specified
         if max_tokens is not None:
             params["max_completion_tokens"] = max_tokens
         
-        # Call OpenAI API
-        openai_response = openai_client.chat.completions.create(**params)
+        # Call OpenAI API and collect the streamed deltas per choice
+        stream = _get_openai_client().chat.completions.create(**params)
+        
+        parts = [[] for _ in range(n)]
+        first_token_time = None
+        for chunk in stream:
+            for choice in chunk.choices:
+                delta = choice.delta.content
+                if delta:
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                    parts[choice.index].append(delta)
         
-        logger.info(f"OpenAI API call took {time.time() - start_time:.2f} seconds")
+        if first_token_time is not None:
+            logger.debug("OpenAI first token after %.2f seconds", first_token_time - start_time)
+        logger.debug("OpenAI API call took %.2f seconds", time.time() - start_time)
         
-        # Extract assistant response
-        assistant_message = openai_response.choices[0].message.content
-        return assistant_message, None
+        # Assemble assistant responses
+        return [''.join(choice_parts) for choice_parts in parts], None
         
     except Exception as e:
         error_msg = f"Error calling OpenAI API: {str(e)}"
@@ -199,55 +482,77 @@ def call_openai_api(
         return None, error_msg
 
 
-def initialize_chat(
-    chat_id: str, 
-    user_id: str,
-    system_message: Optional[str] = None, 
-    initial_assistant_message: Optional[str] = None,
-    initial_user_message: Optional[str] = None,
-    yougov_id: Optional[str] = None,
-    opinion: Optional[str] = None,
-    use_server_treatment: bool = False
+def _existing_chat_response(
+    item: Dict[str, Any],
+    user_id: str
 ) -> Union[ResponseDict, ErrorDict]:
-    """
-    Initialize a new chat session in DynamoDB or return existing one.
-
-    When use_server_treatment is True, the server randomly assigns a treatment
-    and selects the system prompt from TREATMENT_PROMPTS. The system_message
-    parameter is ignored in this case.
-    """
-    # Check if chat already exists
-    existing_chat = table.get_item(Key={'chat_id': chat_id})
+    """Build the initialize response for a chat that is already stored."""
+    stored_user_id = item.get('user_id')
     
-    if 'Item' in existing_chat:
-        logger.info(f"Retrieved existing chat: {chat_id} for user: {user_id}")
-        stored_user_id = existing_chat['Item'].get('user_id')
-        
-        if stored_user_id and stored_user_id != user_id:
-            logger.warning(f"User ID mismatch: provided {user_id}, stored {stored_user_id}")
-            return {'error': 'User ID mismatch'}
-        
-        all_messages = existing_chat['Item'].get('messages', [])
-        visible_messages = [msg for msg in all_messages if msg.get('role') != 'system']
-        
-        return {
-            'chat_id': chat_id,
-            'user_id': stored_user_id or user_id,
-            'is_new': False,
-            'treatment': existing_chat['Item'].get('treatment', ''),
-            'messages': visible_messages
-        }
+    if stored_user_id and stored_user_id != user_id:
+        logger.warning(f"User ID mismatch: provided {user_id}, stored {stored_user_id}")
+        return {'error': 'User ID mismatch'}
+    
+    return {
+        'chat_id': item['chat_id'],
+        'user_id': stored_user_id or user_id,
+        'is_new': False,
+        'treatment': item.get('treatment', ''),
+        'messages': item.get('messages', [])
+    }
 
-    # Check if user has reached the maximum number of chats
-    response = table.scan(
-        FilterExpression='user_id = :uid',
-        ExpressionAttributeValues={':uid': user_id},
-        ProjectionExpression='chat_id'
+
+def _new_chat_response(
+    chat_id: str,
+    user_id: str,
+    treatment: str,
+    messages: ChatHistory
+) -> ResponseDict:
+    """Build the initialize response for a freshly created chat."""
+    return {
+        'chat_id': chat_id,
+        'user_id': user_id,
+        'is_new': True,
+        'treatment': treatment,
+        'messages': messages
+    }
+
+
+def _user_chat_count(user_id: str) -> int:
+    """Count the user's chats, stopping at MAX_CHATS_PER_USER."""
+    # Count via the user_id GSI (see a_init.sh) instead of scanning the
+    # whole table; Limit stops reading once the cap is reached
+    response = dynamodb.query(
+        TableName=TABLE_NAME,
+        IndexName=USER_ID_INDEX,
+        KeyConditionExpression='user_id = :uid',
+        ExpressionAttributeValues=_to_dynamodb({':uid': user_id}),
+        Select='COUNT',
+        Limit=MAX_CHATS_PER_USER
     )
-    user_chat_count = len(response.get('Items', []))
-    if MAX_CHATS_PER_USER and user_chat_count >= MAX_CHATS_PER_USER:
-        return {'error': f'Maximum number of chats ({MAX_CHATS_PER_USER}) reached for this user.'}
+    return response['Count']
+
+
+def _prepare_new_chat(
+    chat_id: str,
+    user_id: str,
+    system_message: Optional[str],
+    initial_assistant_message: Optional[str],
+    initial_user_message: Optional[str],
+    opinion: Optional[str],
+    use_server_treatment: bool,
+    timestamp: str
+) -> Tuple[str, Optional[ChatMessage], ChatHistory, bool]:
+    """
+    Assign the treatment and build the seeded messages for a new chat.
     
+    Returns:
+        Tuple containing:
+            - The assigned treatment ('' without server-side treatment)
+            - The system prompt message, or None
+            - The seeded messages (without the system prompt)
+            - Whether an assistant reply still has to be generated
+    """
     # Server-side treatment randomization
     treatment = ''
     if use_server_treatment:
@@ -256,18 +561,17 @@ def initialize_chat(
             system_message = get_treatment_prompt(opinion)
         else:
             system_message = CONTROL_PROMPT
-        logger.info(f"Assigned treatment '{treatment}' for chat: {chat_id}")
-
-    timestamp = datetime.now().isoformat()
+        logger.debug("Assigned treatment '%s' for chat: %s", treatment, chat_id)
     
-    messages: ChatHistory = []
+    system = None
     if system_message:
-        messages.append({
+        system = {
             'role': 'system',
             'content': system_message,
             'timestamp': timestamp
-        })
+        }
     
+    messages: ChatHistory = []
     if initial_assistant_message:
         messages.append({
             'role': 'assistant',
@@ -275,17 +579,138 @@ def initialize_chat(
             'timestamp': timestamp
         })
     
-    assistant_response = None
     if initial_user_message:
         messages.append({
             'role': 'user',
             'content': initial_user_message,
             'timestamp': timestamp
         })
-        
-        openai_messages = [
-            {'role': msg['role'], 'content': msg['content']} for msg in messages
-        ]
+    
+    # Reply to the initial user message or, when using server treatment and
+    # no other initial message was set, generate an AI opening message from
+    # the system prompt alone
+    needs_reply = bool(initial_user_message) or (
+        use_server_treatment and not initial_assistant_message
+    )
+    return treatment, system, messages, needs_reply
+
+
+def _chat_meta_item(
+    chat_id: str,
+    user_id: str,
+    treatment: str,
+    yougov_id: Optional[str],
+    opinion: Optional[str],
+    messages: ChatHistory,
+    timestamp: str
+) -> Dict[str, Any]:
+    """Build the metadata item (seq 0) for a new chat from its non-system messages."""
+    chat_item = {
+        'chat_id': chat_id,
+        'seq': META_SEQ,
+        'user_id': user_id,
+        'message_count': len(messages),
+        'user_message_count': sum(1 for msg in messages if msg['role'] == 'user'),
+        'created_at': timestamp,
+        'updated_at': timestamp
+    }
+    if treatment:
+        chat_item['treatment'] = treatment
+    if yougov_id:
+        chat_item['yougov_id'] = yougov_id
+    if opinion:
+        chat_item['opinion'] = opinion
+    return chat_item
+
+
+def _write_new_chat(
+    chat_item: Dict[str, Any],
+    system: Optional[ChatMessage],
+    messages: ChatHistory
+) -> bool:
+    """
+    Store a new chat unless a chat with the same chat_id already exists.
+    
+    The metadata and all seeded messages are written atomically in one round
+    trip; the condition on the metadata item only creates the chat if no
+    concurrent request created it meanwhile.
+    
+    Returns:
+        True if the chat was written, False if it already existed
+    """
+    chat_id = chat_item['chat_id']
+    transact_items = [{'Put': {
+        'TableName': TABLE_NAME,
+        'Item': _to_dynamodb(chat_item),
+        'ConditionExpression': 'attribute_not_exists(chat_id)'
+    }}]
+    if system:
+        transact_items.append({'Put': {
+            'TableName': TABLE_NAME,
+            'Item': _to_dynamodb(_message_item(chat_id, SYSTEM_SEQ, system))
+        }})
+    transact_items.extend(
+        {'Put': {
+            'TableName': TABLE_NAME,
+            'Item': _to_dynamodb(_message_item(chat_id, seq, msg))
+        }}
+        for seq, msg in enumerate(messages, start=1)
+    )
+    try:
+        dynamodb.transact_write_items(TransactItems=transact_items)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = e.response.get('CancellationReasons', [])
+        if not reasons or reasons[0].get('Code') != 'ConditionalCheckFailed':
+            raise
+        return False
+    return True
+
+
+def initialize_chat(
+    chat_id: str, 
+    user_id: str,
+    system_message: Optional[str] = None, 
+    initial_assistant_message: Optional[str] = None,
+    initial_user_message: Optional[str] = None,
+    yougov_id: Optional[str] = None,
+    opinion: Optional[str] = None,
+    use_server_treatment: bool = False
+) -> Union[ResponseDict, ErrorDict]:
+    """
+    Initialize a new chat session in DynamoDB or return existing one.
+
+    When use_server_treatment is True, the server randomly assigns a treatment
+    and selects the system prompt from TREATMENT_PROMPTS. The system_message
+    parameter is ignored in this case.
+    """
+    # Count the user's chats while checking if the chat already exists, so
+    # the two independent lookups cost one round trip instead of two
+    count_future = None
+    if MAX_CHATS_PER_USER:
+        count_future = dynamodb_executor.submit(_user_chat_count, user_id)
+    existing_chat = _load_chat(chat_id)
+    user_chat_count = count_future.result() if count_future else 0
+    
+    if existing_chat:
+        logger.debug("Retrieved existing chat: %s for user: %s", chat_id, user_id)
+        return _existing_chat_response(existing_chat, user_id)
+
+    # Check if user has reached the maximum number of chats
+    if MAX_CHATS_PER_USER and user_chat_count >= MAX_CHATS_PER_USER:
+        return {'error': f'Maximum number of chats ({MAX_CHATS_PER_USER}) reached for this user.'}
+    
+    # One timestamp for the metadata and all seeded messages; only a
+    # generated reply gets its own, taken when it arrives
+    timestamp = datetime.now().isoformat()
+    treatment, system, messages, needs_reply = _prepare_new_chat(
+        chat_id, user_id, system_message, initial_assistant_message,
+        initial_user_message, opinion, use_server_treatment, timestamp
+    )
+    
+    if needs_reply:
+        openai_messages = _build_openai_messages(system, messages)
         assistant_response, error = call_openai_api(openai_messages)
         
         if error:
@@ -298,51 +723,158 @@ def initialize_chat(
                 'timestamp': datetime.now().isoformat()
             })
     
-    # When using server treatment and no other initial message was set,
-    # generate an AI opening message from the system prompt alone
-    if use_server_treatment and not initial_assistant_message and not initial_user_message:
-        openai_messages = [
-            {'role': msg['role'], 'content': msg['content']} for msg in messages
+    chat_item = _chat_meta_item(
+        chat_id, user_id, treatment, yougov_id, opinion, messages, timestamp
+    )
+    
+    if not _write_new_chat(chat_item, system, messages):
+        existing_chat = _load_chat(chat_id, consistent=True)
+        logger.info(f"Chat {chat_id} was created concurrently, returning stored chat")
+        return _existing_chat_response(existing_chat, user_id)
+    
+    logger.debug("Initialized new chat: %s for user: %s", chat_id, user_id)
+    
+    return _new_chat_response(chat_id, user_id, treatment, messages)
+
+
+def initialize_chats(chats: List[Dict[str, Any]]) -> Union[ResponseDict, ErrorDict]:
+    """
+    Initialize several chat sessions at once, e.g. when many participants
+    start an experiment at the same moment.
+    
+    Each entry accepts the same fields as initialize_chat. New chats whose
+    prompts are identical share a single OpenAI call that generates one
+    reply per chat (n > 1); the calls for different prompts run concurrently,
+    up to MAX_OPENAI_CALLS_PER_BATCH calls and MAX_REPLIES_PER_BATCH replies
+    per request. The new chats are written concurrently. Existing chats,
+    including ones created while the replies were being generated, are
+    returned as by initialize_chat.
+    
+    Args:
+        chats: List of chat specifications with at least chat_id and user_id
+    
+    Returns:
+        Dictionary containing:
+            - chats: One initialize result (or error dictionary with chat_id)
+              per distinct chat_id, in request order
+        Or an error dictionary if something goes wrong
+    """
+    if MAX_CHATS_PER_BATCH and len(chats) > MAX_CHATS_PER_BATCH:
+        return {'error': f'At most {MAX_CHATS_PER_BATCH} chats can be initialized at once.'}
+    
+    timestamp = datetime.now().isoformat()
+    results: Dict[str, Union[ResponseDict, ErrorDict]] = {}
+    new_chats: Dict[str, Dict[str, Any]] = {}
+    user_chat_counts: Dict[str, int] = {}
+    
+    # Look up all chats and the distinct users' chat counts concurrently
+    chat_ids = list(dict.fromkeys(spec['chat_id'] for spec in chats))
+    load_futures = [dynamodb_executor.submit(_load_chat, chat_id) for chat_id in chat_ids]
+    if MAX_CHATS_PER_USER:
+        user_ids = list(dict.fromkeys(spec['user_id'] for spec in chats))
+        count_futures = [
+            dynamodb_executor.submit(_user_chat_count, user_id) for user_id in user_ids
         ]
-        first_message, error = call_openai_api(openai_messages)
+        user_chat_counts = dict(zip(user_ids, (f.result() for f in count_futures)))
+    existing_chats = dict(zip(chat_ids, (f.result() for f in load_futures)))
+    
+    for spec in chats:
+        chat_id = spec['chat_id']
+        user_id = spec['user_id']
+        if chat_id in results or chat_id in new_chats:
+            continue
         
-        if error:
-            return {'error': error}
+        existing_chat = existing_chats[chat_id]
+        if existing_chat:
+            results[chat_id] = _existing_chat_response(existing_chat, user_id)
+            continue
         
-        if first_message:
-            messages.append({
-                'role': 'assistant',
-                'content': first_message,
-                'timestamp': datetime.now().isoformat()
-            })
+        if MAX_CHATS_PER_USER:
+            if user_chat_counts[user_id] >= MAX_CHATS_PER_USER:
+                results[chat_id] = {
+                    'chat_id': chat_id,
+                    'error': f'Maximum number of chats ({MAX_CHATS_PER_USER}) reached for this user.'
+                }
+                continue
+            user_chat_counts[user_id] += 1
+        
+        treatment, system, messages, needs_reply = _prepare_new_chat(
+            chat_id, user_id, spec.get('system_message'),
+            spec.get('initial_assistant_message'), spec.get('initial_user_message'),
+            spec.get('opinion'), spec.get('use_server_treatment', False), timestamp
+        )
+        new_chats[chat_id] = {
+            'spec': spec,
+            'treatment': treatment,
+            'system': system,
+            'messages': messages,
+            'needs_reply': needs_reply
+        }
     
-    chat_item = {
-        'chat_id': chat_id,
-        'user_id': user_id,
-        'messages': messages,
-        'created_at': timestamp,
-        'updated_at': timestamp
-    }
-    if treatment:
-        chat_item['treatment'] = treatment
-    if yougov_id:
-        chat_item['yougov_id'] = yougov_id
-    if opinion:
-        chat_item['opinion'] = opinion
+    # Group chats that send identical prompts, one OpenAI call per group
+    groups: Dict[Tuple[Tuple[str, str], ...], List[str]] = {}
+    for chat_id, chat in new_chats.items():
+        if chat['needs_reply']:
+            prompt = tuple(
+                (msg['role'], msg['content'])
+                for msg in _build_openai_messages(chat['system'], chat['messages'])
+            )
+            groups.setdefault(prompt, []).append(chat_id)
     
-    table.put_item(Item=chat_item)
+    if MAX_OPENAI_CALLS_PER_BATCH and len(groups) > MAX_OPENAI_CALLS_PER_BATCH:
+        return {'error': f'At most {MAX_OPENAI_CALLS_PER_BATCH} distinct prompts can be generated per batch.'}
+    if MAX_REPLIES_PER_BATCH and sum(map(len, groups.values())) > MAX_REPLIES_PER_BATCH:
+        return {'error': f'At most {MAX_REPLIES_PER_BATCH} replies can be generated per batch.'}
     
-    logger.info(f"Initialized new chat: {chat_id} for user: {user_id}")
+    def generate(prompt: Tuple[Tuple[str, str], ...]) -> Tuple[Optional[List[str]], Optional[str], str]:
+        openai_messages = [{'role': role, 'content': content} for role, content in prompt]
+        replies, error = call_openai_api_n(openai_messages, len(groups[prompt]))
+        return replies, error, datetime.now().isoformat()
     
-    visible_messages = [msg for msg in messages if msg.get('role') != 'system']
+    # The groups are independent, so their calls run concurrently and the
+    # batch takes about as long as its slowest completion
+    for chat_ids, (replies, error, reply_timestamp) in zip(
+        groups.values(), openai_executor.map(generate, groups)
+    ):
+        for i, chat_id in enumerate(chat_ids):
+            if error:
+                results[chat_id] = {'chat_id': chat_id, 'error': error}
+                del new_chats[chat_id]
+            elif replies[i]:
+                new_chats[chat_id]['messages'].append({
+                    'role': 'assistant',
+                    'content': replies[i],
+                    'timestamp': reply_timestamp
+                })
     
-    return {
-        'chat_id': chat_id,
-        'user_id': user_id,
-        'is_new': True,
-        'treatment': treatment,
-        'messages': visible_messages
-    }
+    def write_chat(chat_id: str) -> Union[ResponseDict, ErrorDict]:
+        chat = new_chats[chat_id]
+        user_id = chat['spec']['user_id']
+        chat_item = _chat_meta_item(
+            chat_id, user_id, chat['treatment'], chat['spec'].get('yougov_id'),
+            chat['spec'].get('opinion'), chat['messages'], timestamp
+        )
+        if not _write_new_chat(chat_item, chat['system'], chat['messages']):
+            # Created meanwhile, e.g. by the initialize route on page load
+            logger.info(f"Chat {chat_id} was created concurrently, returning stored chat")
+            return _existing_chat_response(_load_chat(chat_id, consistent=True), user_id)
+        return _new_chat_response(chat_id, user_id, chat['treatment'], chat['messages'])
+    
+    # The OpenAI calls above take seconds, so every chat is written with the
+    # same conditional transaction as initialize_chat instead of blind batch
+    # puts that could overwrite a chat created in the meantime
+    written = list(new_chats)
+    results.update(zip(written, dynamodb_executor.map(write_chat, written)))
+    
+    created = sum(1 for chat_id in written if results[chat_id].get('is_new'))
+    logger.debug("Initialized %d new chats in batch", created)
+    
+    ordered = []
+    for spec in chats:
+        result = results.pop(spec['chat_id'], None)
+        if result is not None:
+            ordered.append(result)
+    return {'chats': ordered}
 
 
 def add_message_and_get_response(
@@ -353,6 +885,10 @@ def add_message_and_get_response(
     """
     Add a message to the chat history and get a response from OpenAI.
     
+    Nothing is stored unless a reply was generated: the message limit is
+    checked and OpenAI is called first, then the user message and the reply
+    are written together. Rejected or failed turns leave the chat unchanged.
+    
     Args:
         chat_id: Unique identifier for the chat session
         user_id: Identifier for the user
@@ -368,37 +904,35 @@ def add_message_and_get_response(
             - user_id: The user identifier
         Or an error dictionary if something goes wrong
     """
-    # Get existing chat history
-    response = table.get_item(Key={'chat_id': chat_id})
-    if 'Item' not in response:
+    # Get existing chat history, already shaped for the OpenAI API. The read
+    # is strongly consistent: its message_count is the token the write below
+    # is conditioned on, and a stale read would both reject the turn and
+    # leave the previous turn out of the prompt
+    chat_item = _load_chat(chat_id, consistent=True, attributes=PROMPT_ATTRIBUTES)
+    if not chat_item:
         return {'error': f"Chat session {chat_id} not found"}
     
     # Verify user_id matches
-    stored_user_id = response['Item'].get('user_id')
+    stored_user_id = chat_item.get('user_id')
     if stored_user_id and stored_user_id != user_id:
         logger.warning(f"User ID mismatch: provided {user_id}, stored {stored_user_id}")
         return {'error': 'User ID mismatch'}
     
-    chat_history = response['Item']
-    messages = chat_history.get('messages', [])
-
-    user_message_count = sum(1 for msg in messages if msg.get('role') == 'user')
-    if MAX_MESSAGES_PER_CHAT and user_message_count >= MAX_MESSAGES_PER_CHAT:
+    # Checked here to avoid an OpenAI call, and enforced again in the write
+    if MAX_MESSAGES_PER_CHAT and chat_item['user_message_count'] >= MAX_MESSAGES_PER_CHAT:
         return {'error': f'Message limit of {MAX_MESSAGES_PER_CHAT} reached for this chat.'}
     
-    # Add new message to history
+    # The user message is only written together with the reply below
     timestamp = datetime.now().isoformat()
     new_message = {
         'role': 'user',
         'content': message,
         'timestamp': timestamp
     }
-    messages.append(new_message)
     
     # Format messages for OpenAI API
-    openai_messages = [
-        {'role': msg['role'], 'content': msg['content']} for msg in messages
-    ]
+    openai_messages = _window_messages(chat_item['system'], chat_item['messages'])
+    openai_messages.append({'role': 'user', 'content': message})
     
     # Call OpenAI API using the helper function
     assistant_message, error = call_openai_api(openai_messages)
@@ -406,23 +940,66 @@ def add_message_and_get_response(
     if error:
         return {'error': error}
     
-    # Add assistant response to history
+    # Stamped separately from the user message so the stored data keeps the
+    # response time; updated_at reuses this value
     assistant_entry = {
         'role': 'assistant',
         'content': assistant_message,
         'timestamp': datetime.now().isoformat()
     }
-    messages.append(assistant_entry)
-    
-    # Update DynamoDB
-    table.update_item(
-        Key={'chat_id': chat_id},
-        UpdateExpression="SET messages = :messages, updated_at = :updated_at",
-        ExpressionAttributeValues={
-            ':messages': messages,
-            ':updated_at': datetime.now().isoformat()
-        }
-    )
+    
+    # Store both messages and bump the counters in one transaction; the
+    # condition re-checks ownership and the message limit server-side, and
+    # rejects the write if another turn was stored concurrently, so
+    # sequence numbers never collide
+    message_count = chat_item['message_count']
+    condition = 'user_id = :uid AND message_count = :count'
+    values = {
+        ':new_count': message_count + 2,
+        ':count': message_count,
+        ':one': 1,
+        ':uid': user_id,
+        ':updated_at': assistant_entry['timestamp']
+    }
+    if MAX_MESSAGES_PER_CHAT:
+        condition += ' AND user_message_count < :max'
+        values[':max'] = MAX_MESSAGES_PER_CHAT
+    try:
+        dynamodb.transact_write_items(TransactItems=[
+            {'Update': {
+                'TableName': TABLE_NAME,
+                'Key': _to_dynamodb({'chat_id': chat_id, 'seq': META_SEQ}),
+                'UpdateExpression': (
+                    'SET message_count = :new_count, updated_at = :updated_at '
+                    'ADD user_message_count :one'
+                ),
+                'ConditionExpression': condition,
+                'ExpressionAttributeValues': _to_dynamodb(values)
+            }},
+            {'Put': {
+                'TableName': TABLE_NAME,
+                'Item': _to_dynamodb(_message_item(chat_id, message_count + 1, new_message))
+            }},
+            {'Put': {
+                'TableName': TABLE_NAME,
+                'Item': _to_dynamodb(_message_item(chat_id, message_count + 2, assistant_entry))
+            }}
+        ])
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        # Re-read the metadata once to report why the condition failed
+        response = dynamodb.get_item(
+            TableName=TABLE_NAME,
+            Key=_to_dynamodb({'chat_id': chat_id, 'seq': META_SEQ}),
+            ProjectionExpression='user_message_count',
+            ConsistentRead=True
+        )
+        stored = _from_dynamodb(response.get('Item', {}))
+        if MAX_MESSAGES_PER_CHAT and stored.get('user_message_count', 0) >= MAX_MESSAGES_PER_CHAT:
+            return {'error': f'Message limit of {MAX_MESSAGES_PER_CHAT} reached for this chat.'}
+        logger.warning(f"Concurrent update of chat {chat_id}, message not stored")
+        return {'error': 'Chat was updated by another request. Please try again.'}
     
     return {'message': assistant_message, 
             'chat_id': chat_id, 
@@ -444,14 +1021,18 @@ def get_chat_history(
         Dictionary containing the chat history with messages
         Or an error dictionary if something goes wrong
     """
-    response = table.get_item(Key={'chat_id': chat_id})
-    if 'Item' not in response:
+    chat_item = _load_chat(chat_id)
+    if not chat_item:
         return {'error': f"Chat session {chat_id} not found"}
     
     # Verify user_id matches
-    stored_user_id = response['Item'].get('user_id')
+    stored_user_id = chat_item.get('user_id')
     if stored_user_id and stored_user_id != user_id:
         logger.warning(f"User ID mismatch: provided {user_id}, stored {stored_user_id}")
         return {'error': 'User ID mismatch'}
     
-    return response['Item']
+    # The history keeps listing the system prompt as the first message
+    system = chat_item.pop('system')
+    if system:
+        chat_item['messages'].insert(0, system)
+    return chat_item
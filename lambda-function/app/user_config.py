@@ -1,13 +1,13 @@
 """
 User configuration for Lambda function access control.
-Update this list to control which users can access the API from non-localhost origins.
+Update this set to control which users can access the API from non-localhost origins.
 """
 
-# List of allowed user IDs for non-localhost origins
+# Allowed user IDs for non-localhost origins (a frozenset for O(1) lookups)
 # Leave empty to allow all users from configured origins
 # For otree, use participant.code as the user ID
-ALLOWED_USER_IDS = [
+ALLOWED_USER_IDS = frozenset([
     # "user123",
     # "user456", 
     # "user789"
-]
\ No newline at end of file
+])
\ No newline at end of file
@@ -4,7 +4,9 @@
 from __future__ import annotations
 
 import argparse
+import base64
 import json
+from collections import defaultdict
 from pathlib import Path
 
 import pandas as pd
@@ -27,11 +29,56 @@ def load_dynamodb_export_json(path: str | Path) -> pd.DataFrame:
 
     deserializer = TypeDeserializer()
     rows = [
-        {k: deserializer.deserialize(v) for k, v in item.items()} for item in items
+        {k: deserializer.deserialize(_decode_binary(v)) for k, v in item.items()}
+        for item in items
     ]
+    if any("seq" in row for row in rows):
+        rows = group_message_items(rows)
     return pd.DataFrame(rows)
 
 
+def _decode_binary(value: dict) -> dict:
+    """Turn base64-encoded binary attribute values back into bytes."""
+    if "B" in value and isinstance(value["B"], str):
+        return {"B": base64.b64decode(value["B"])}
+    return value
+
+
+def _decompress_content(row: dict) -> dict:
+    """Restore message content stored zstd-compressed by the Lambda function."""
+    if row.pop("encoding", None) == "zstd":
+        import zstandard
+
+        data = row.pop("content_z").value
+        row["content"] = zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return row
+
+
+def group_message_items(rows: list[dict]) -> list[dict]:
+    """Fold one-item-per-message rows into one row per chat.
+
+    The metadata item (seq 0) becomes the chat row; the message items are
+    attached to it in order as a ``messages`` list, starting with the system
+    prompt (seq -1), matching the layout of exports from tables that stored
+    all messages in a single item.
+    """
+    chats: dict[str, dict] = {}
+    messages: dict[str, list[tuple[int, dict]]] = defaultdict(list)
+    for row in rows:
+        row = dict(row)
+        seq = int(row.pop("seq"))
+        chat_id = row["chat_id"]
+        if seq == 0:
+            chats[chat_id] = row
+        else:
+            del row["chat_id"]
+            messages[chat_id].append((seq, _decompress_content(row)))
+
+    for chat_id, chat in chats.items():
+        chat["messages"] = [msg for _, msg in sorted(messages[chat_id], key=lambda m: m[0])]
+    return list(chats.values())
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
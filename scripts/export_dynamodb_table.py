@@ -3,12 +3,20 @@
 from __future__ import annotations
 
 import argparse
+import base64
 import json
 from pathlib import Path
 
 import boto3
 
 
+def _encode_binary(value: object) -> str:
+    """Write binary attribute values (e.g. compressed content) as base64."""
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
 def export_dynamodb_table(
     table_name: str = "yougov-ai-table",
     region: str = "eu-central-1",
@@ -24,7 +32,7 @@ def export_dynamodb_table(
 
     payload = {"TableName": table_name, "ItemCount": len(items), "Items": items}
     with out_path.open("w", encoding="utf-8", newline="\n") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+        json.dump(payload, f, ensure_ascii=False, indent=2, default=_encode_binary)
 
     print(f"Wrote {len(items)} items to {out_path}")
     return out_path